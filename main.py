@@ -1,37 +1,72 @@
+from __future__ import annotations
+
 import os
+import time
+import signal
 import asyncio
 import random
+import functools
 import aiohttp
+import orjson
 import logging
+from dataclasses import dataclass
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder, CommandHandler,
     CallbackQueryHandler, ContextTypes,
-    MessageHandler, filters, ConversationHandler
+    MessageHandler, filters
 )
-import nest_asyncio
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 # === Setup === #
-nest_asyncio.apply()
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 GROUP_CHAT_ID = int(os.getenv("GROUP_CHAT_ID", "-1001571487413"))
-QUOTE_INTERVAL = int(os.getenv("QUOTE_INTERVAL", "3"))  # seconds, default 3 mins
+QUOTE_INTERVAL = int(os.getenv("QUOTE_INTERVAL", "180"))  # seconds, default 3 mins
 ALLOWED_USER_IDS = [1861017597]  # Update with your Telegram user ID(s)
 
-last_message_info = {}
-user_sessions = {}
+# Everything the bot tracks about one chat
+@dataclass(slots=True)
+class ChatState:
+    message_id: int | None = None  # last quote posted
+    has_reaction: bool = False  # whether that quote was saved
+    active: bool = False  # /start interval posting running
+    schedule_desc: str | None = None  # active /schedule job, if any
+
+STATES = {}
 PHILOSOPHER_NAMES = {}
 scheduler = AsyncIOScheduler()
-schedule_settings = {}
 bot_instance = None
+HTTP_SESSION = None  # shared aiohttp session, created in main()
+
+# Quote list cache, refilled at most once per QUOTE_CACHE_TTL seconds.
+# "data" holds ready-to-send Markdown messages, formatted once per refill.
+QUOTE_CACHE_TTL = int(os.getenv("QUOTE_CACHE_TTL", "3600"))
+_QUOTE_CACHE = {"data": None, "expires": 0.0}
+_QUOTE_CACHE_LOCK = asyncio.Lock()
+_RNG = random.Random()
+
+# Client-side throttle for philosophersapi.com, plus retry on 429/503
+_API_LIMITER = AsyncLimiter(max_rate=10, time_period=60)
+API_MAX_RETRIES = 3
+
+# Validators from the last philosopher list, so refreshes can get a bodiless 304
+_PHIL_ETAG = None
+_PHIL_LAST_MODIFIED = None
+PHILOSOPHER_REFRESH_HOURS = 24
 
-# Store all previous message IDs for each chat
-all_message_ids = {}
+# Reply markups are immutable, so build the two button states once
+SAVE_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("❤️ SAVE", callback_data="heart_reaction")]])
+UNSAVE_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🖤 UNSAVE", callback_data="heart_reaction")]])
 
 # === Logging === #
 logging.basicConfig(
@@ -40,186 +75,303 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# === API Requests === #
+def retry_delay(resp, attempt):
+    # Honour Retry-After (seconds form) when the server sends it, else back off exponentially
+    try:
+        delay = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        delay = 2 ** attempt
+    return min(60, delay)
+
+# GET a philosophersapi.com URL; returns (status, data, response headers),
+# data is None unless status is 200
+async def api_get(url, headers=None):
+    for attempt in range(API_MAX_RETRIES + 1):
+        async with _API_LIMITER:
+            async with HTTP_SESSION.get(url, headers=headers) as resp:
+                if resp.status not in (429, 503) or attempt == API_MAX_RETRIES:
+                    data = orjson.loads(await resp.read()) if resp.status == 200 else None
+                    return resp.status, data, resp.headers
+                delay = retry_delay(resp, attempt)
+        logger.warning(f"API returned {resp.status} for {url}, retrying in {delay:.0f}s")
+        await asyncio.sleep(delay)
+
 # === Load Philosophers === #
 async def load_philosophers():
+    global _PHIL_ETAG, _PHIL_LAST_MODIFIED
     url = "https://philosophersapi.com/api/philosophers"
+    headers = {}
+    if PHILOSOPHER_NAMES:
+        if _PHIL_ETAG:
+            headers["If-None-Match"] = _PHIL_ETAG
+        if _PHIL_LAST_MODIFIED:
+            headers["If-Modified-Since"] = _PHIL_LAST_MODIFIED
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    for item in data:
-                        PHILOSOPHER_NAMES[item['id']] = item['name']
-                else:
-                    logger.warning(f"Failed to fetch philosophers: {resp.status}")
+        status, data, resp_headers = await api_get(url, headers=headers)
+        if status == 200:
+            for item in data:
+                PHILOSOPHER_NAMES[item['id']] = item['name']
+            _PHIL_ETAG = resp_headers.get("ETag")
+            _PHIL_LAST_MODIFIED = resp_headers.get("Last-Modified")
+            # Cached quotes have names baked in; make the next fetch re-format them
+            format_quote.cache_clear()
+            _QUOTE_CACHE["expires"] = 0.0
+        elif status == 304:
+            logger.info("Philosopher list not modified")
+        else:
+            logger.warning(f"Failed to fetch philosophers: {status}")
     except Exception as e:
         logger.error(f"Error loading philosophers: {e}")
 
 # === Fetch Quote === #
+# Memoized so hourly refills don't re-format quotes we've already seen;
+# load_philosophers clears it whenever names change
+@functools.lru_cache(maxsize=None)
+def format_quote(quote_text, philosopher_id):
+    name = PHILOSOPHER_NAMES.get(philosopher_id, "Unknown")
+    return f'_"{quote_text}"_\n\n*–{name}*'
+
+def format_quotes(data):
+    # Plain loop (not a genexp) so fmt is a true fast local, not a closure cell
+    fmt = format_quote
+    formatted = []
+    for q in data:
+        # The API can send null fields; one bad entry must not abort the whole refill
+        quote = (q.get("quote") or "").strip()
+        philosopher_id = (q.get("philosopher") or {}).get("id", "")
+        formatted.append(fmt(quote, philosopher_id))
+    return tuple(formatted)
+
+async def get_quotes():
+    if _QUOTE_CACHE["data"] and time.monotonic() < _QUOTE_CACHE["expires"]:
+        return _QUOTE_CACHE["data"]
+
+    # Single-flight: concurrent callers wait for one refill instead of each fetching
+    async with _QUOTE_CACHE_LOCK:
+        if _QUOTE_CACHE["data"] and time.monotonic() < _QUOTE_CACHE["expires"]:
+            return _QUOTE_CACHE["data"]
+
+        url = "https://philosophersapi.com/api/quotes"
+        try:
+            status, data, _ = await api_get(url)
+        except Exception as e:
+            logger.error(f"Quote fetch error: {e}")
+            return _QUOTE_CACHE["data"]
+        if status != 200:
+            logger.warning(f"Failed to fetch quotes: {status}")
+            # Serve stale quotes rather than nothing if we have them
+            return _QUOTE_CACHE["data"]
+        if data:
+            data = format_quotes(data)
+            _QUOTE_CACHE["data"] = data
+            _QUOTE_CACHE["expires"] = time.monotonic() + QUOTE_CACHE_TTL
+        return data
+
 async def fetch_quote():
     if not PHILOSOPHER_NAMES:
         await load_philosophers()
 
-    url = "https://philosophersapi.com/api/quotes"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if not data:
-                        return "_No quotes found._"
-
-                    quote_data = random.choice(data)
-                    quote = quote_data.get("quote", "").strip()
-                    philosopher_id = quote_data.get("philosopher", {}).get("id", "")
-                    name = PHILOSOPHER_NAMES.get(philosopher_id, "Unknown")
-                    return f'_"{quote}"_\n\n*–{name}*'
-                return "_Quote service unavailable._"
+        data = await get_quotes()
+        if data is None:
+            return "_Quote service unavailable._"
+        if not data:
+            return "_No quotes found._"
+
+        return data[_RNG.randrange(len(data))]
     except Exception as e:
         logger.error(f"Quote fetch error: {e}")
         return "_Failed to retrieve quote._"
 
+# === Chat State === #
+# Get a chat's state for writing, creating it on first use; read-only paths use STATES.get
+def chat_state(chat_id):
+    state = STATES.get(chat_id)
+    if state is None:
+        state = STATES[chat_id] = ChatState()
+    return state
+
 # === Commands === #
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
+    message = update.message
     if chat_id != GROUP_CHAT_ID:
-        await update.message.reply_text("Use this bot in the designated group.")
+        await message.reply_text("Use this bot in the designated group.")
         return
 
-    await update.message.reply_text("Quote bot activated! Use /schedule to set up automatic quotes, or /new for a manual quote.")
+    # Automatic posting shares the scheduler with /schedule: one timer source, O(1) cancel
+    scheduler.add_job(
+        send_scheduled_quote, IntervalTrigger(seconds=QUOTE_INTERVAL),
+        args=[chat_id], id=f"interval-{chat_id}", replace_existing=True
+    )
+    chat_state(chat_id).active = True
+    await message.reply_text("Quote bot activated! Use /schedule to set up automatic quotes, or /new for a manual quote.")
 
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    if user_sessions.pop(chat_id, None):
-        await update.message.reply_text("Quote bot stopped.")
+    state = STATES.get(chat_id)
+    if state and state.active:
+        state.active = False
+        scheduler.remove_job(f"interval-{chat_id}")
+        reply = "Quote bot stopped."
     else:
-        await update.message.reply_text("Bot is not running.")
+        reply = "Bot is not running."
+    await update.message.reply_text(reply)
 
 # /schedule command
-SCHEDULE_WAITING = 1
-# /schedule command (step 1)
+# Quotes are scheduled through inline buttons; callback_data is "sched:<owner>:HH:MM:freq",
+# where owner is the user who sent /schedule and is the only one whose presses count
+SCHEDULE_TIMES = ("08:00", "12:00", "18:00", "21:00")
+SCHEDULE_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# freq -> (CronTrigger kwargs, description prefix); picked days are encoded separately
+SCHEDULE_FREQS = {
+    "daily": ({}, "every day"),
+    "weekdays": ({"day_of_week": "mon-fri"}, "on weekdays"),
+    "weekends": ({"day_of_week": "sat,sun"}, "on weekends"),
+    "monthly": ({"day": 1}, "on day 1 of each month"),
+}
+
+def schedule_time_markup(owner):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(t, callback_data=f"sched:{owner}:{t}") for t in SCHEDULE_TIMES],
+        [InlineKeyboardButton("Custom time", callback_data=f"sched:{owner}:custom")],
+    ])
+
+# Day buttons toggle a bitmask ("days<mask>"); "on<mask>" schedules the picked days
+def schedule_freq_markup(owner, hour, minute, days_mask=0):
+    prefix = f"sched:{owner}:{hour:02d}:{minute:02d}"
+    rows = [
+        [InlineKeyboardButton(f.capitalize(), callback_data=f"{prefix}:{f}") for f in SCHEDULE_FREQS],
+        [InlineKeyboardButton(("✅ " if days_mask >> i & 1 else "") + d.capitalize(),
+                              callback_data=f"{prefix}:days{days_mask ^ (1 << i)}")
+         for i, d in enumerate(SCHEDULE_DAYS)],
+    ]
+    if days_mask:
+        rows.append([InlineKeyboardButton(f"Schedule on {mask_days(days_mask)}",
+                                          callback_data=f"{prefix}:on{days_mask}")])
+    return InlineKeyboardMarkup(rows)
+
+def mask_days(days_mask):
+    return ",".join(d for i, d in enumerate(SCHEDULE_DAYS) if days_mask >> i & 1)
+
+def parse_days_mask(text):
+    days_mask = int(text)
+    if not 0 <= days_mask < 1 << len(SCHEDULE_DAYS):
+        raise ValueError
+    return days_mask
+
+def parse_time(text):
+    hour, minute = map(int, text.split(":"))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError
+    return hour, minute
+
+# /schedule: offer the time picker
 async def schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     if chat_id != GROUP_CHAT_ID:
         await update.message.reply_text("Use this bot in the designated group.")
-        return ConversationHandler.END
-    await update.message.reply_text(
-        "Send the time for the quote (24h format, e.g. 14:30):"
-    )
-    return 1
+        return
+    state = STATES.get(chat_id)
+    text = "Pick a time for the quote:"
+    if state and state.schedule_desc:
+        text = f"Currently scheduled {state.schedule_desc}.\n{text}"
+    await update.message.reply_text(text, reply_markup=schedule_time_markup(update.effective_user.id))
+
+# Schedule button presses: time picked -> offer frequencies; frequency picked -> schedule
+async def handle_schedule_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    owner, *parts = query.data.split(":")[1:]
+    if owner != str(query.from_user.id):
+        await query.answer("Only the user who sent /schedule can pick.", show_alert=True)
+        return
+    await query.answer()
+    owner = int(owner)
+
+    if parts == ["custom"]:
+        # Per-user, so only this user's next message in this chat is read as the time
+        context.user_data['awaiting_schedule_time'] = query.message.chat_id
+        await query.edit_message_text("Send the time for the quote (24h format, e.g. 14:30):")
+        return
 
-# /schedule step 2: get time
-async def schedule_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = update.message.text.strip()
     try:
-        hour, minute = map(int, text.split(":"))
-        if not (0 <= hour < 24 and 0 <= minute < 60):
-            raise ValueError
-        context.user_data['schedule_time'] = (hour, minute)
-        await update.message.reply_text(
-            "How often? Reply with one of: daily, weekly, monthly, specific-days (comma-separated, e.g. mon,wed,fri)"
+        hour, minute = parse_time(":".join(parts[:2]))
+    except ValueError:
+        return
+    if len(parts) == 2:
+        await query.edit_message_text(
+            f"Quote at {hour:02d}:{minute:02d}. How often?",
+            reply_markup=schedule_freq_markup(owner, hour, minute)
         )
-        return 2
-    except Exception:
-        await update.message.reply_text("Invalid time format. Please use HH:MM (24h). Try again:")
-        return 1
-
-# /schedule step 3: get frequency
-async def schedule_freq(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    freq = update.message.text.strip().lower()
-    context.user_data['schedule_freq'] = freq
-    if freq == 'specific-days':
-        await update.message.reply_text("Enter days (comma-separated, e.g. mon,wed,fri):")
-        return 3
-    await confirm_schedule(update, context)
-    return ConversationHandler.END
-
-# /schedule step 4: get specific days
-async def schedule_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    days = [d.strip().lower()[:3] for d in update.message.text.split(",")]
-    context.user_data['schedule_days'] = days
-    await confirm_schedule(update, context)
-    return ConversationHandler.END
-
-# Confirm and set schedule
-async def confirm_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    hour, minute = context.user_data['schedule_time']
-    freq = context.user_data['schedule_freq']
-    days = context.user_data.get('schedule_days', None)
-    # Remove previous job if any
-    if chat_id in schedule_settings:
-        scheduler.remove_job(str(chat_id))
-    # Build cron trigger
-    if freq == 'daily':
-        trigger = CronTrigger(hour=hour, minute=minute)
-        desc = f"every day at {hour:02d}:{minute:02d}"
-    elif freq == 'weekly':
-        await update.message.reply_text("Which day of week? (e.g. mon, tue, ...)")
-        return 3
-    elif freq == 'monthly':
-        await update.message.reply_text("Which day of month? (1-31)")
-        return 4
-    elif freq == 'specific-days':
-        dow = ','.join(days)
-        trigger = CronTrigger(day_of_week=dow, hour=hour, minute=minute)
-        desc = f"on {dow} at {hour:02d}:{minute:02d}"
+        return
+
+    freq = parts[2]
+    if freq in SCHEDULE_FREQS:
+        cron_kwargs, when = SCHEDULE_FREQS[freq]
     else:
-        await update.message.reply_text("Invalid frequency. Use: daily, weekly, monthly, specific-days.")
-        return ConversationHandler.END
-    # Schedule job
-    scheduler.add_job(send_scheduled_quote, trigger, args=[chat_id], id=str(chat_id), replace_existing=True)
-    schedule_settings[chat_id] = {'trigger': trigger, 'desc': desc}
-    await update.message.reply_text(f"Scheduled quote {desc}.")
-
-# For weekly/monthly extra step
-async def schedule_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    day = update.message.text.strip().lower()[:3]
-    hour, minute = context.user_data['schedule_time']
-    trigger = CronTrigger(day_of_week=day, hour=hour, minute=minute)
-    desc = f"every {day} at {hour:02d}:{minute:02d}"
-    chat_id = update.effective_chat.id
-    scheduler.add_job(send_scheduled_quote, trigger, args=[chat_id], id=str(chat_id), replace_existing=True)
-    schedule_settings[chat_id] = {'trigger': trigger, 'desc': desc}
-    await update.message.reply_text(f"Scheduled quote {desc}.")
-    return ConversationHandler.END
-
-async def schedule_monthly(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    day = int(update.message.text.strip())
-    hour, minute = context.user_data['schedule_time']
-    trigger = CronTrigger(day=day, hour=hour, minute=minute)
-    desc = f"on day {day} of each month at {hour:02d}:{minute:02d}"
-    chat_id = update.effective_chat.id
+        try:
+            if freq.startswith("days"):
+                await query.edit_message_text(
+                    f"Quote at {hour:02d}:{minute:02d}. How often?",
+                    reply_markup=schedule_freq_markup(owner, hour, minute, parse_days_mask(freq[4:]))
+                )
+                return
+            if not freq.startswith("on"):
+                return
+            dow = mask_days(parse_days_mask(freq[2:]))
+        except ValueError:
+            return
+        if not dow:
+            return
+        cron_kwargs, when = {"day_of_week": dow}, f"on {dow}"
+    desc = set_schedule(query.message.chat_id, hour, minute, cron_kwargs, when)
+    await query.edit_message_text(f"Scheduled quote {desc}.")
+
+# Text fallback, only consulted for the user who pressed "Custom time" in this chat
+async def schedule_custom_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    if not user_data or user_data.get('awaiting_schedule_time') != update.effective_chat.id:
+        return
+    # One attempt per "Custom time" press, so a typo doesn't leave the chat being parsed
+    user_data.pop('awaiting_schedule_time', None)
+    message = update.effective_message
+    try:
+        hour, minute = parse_time(message.text.strip())
+    except ValueError:
+        await message.reply_text("Invalid time format. Please use HH:MM (24h). Send /schedule to try again.")
+        return
+    await message.reply_text(
+        f"Quote at {hour:02d}:{minute:02d}. How often?",
+        reply_markup=schedule_freq_markup(update.effective_user.id, hour, minute)
+    )
+
+def set_schedule(chat_id, hour, minute, cron_kwargs, when):
+    trigger = CronTrigger(hour=hour, minute=minute, **cron_kwargs)
+    desc = f"{when} at {hour:02d}:{minute:02d}"
     scheduler.add_job(send_scheduled_quote, trigger, args=[chat_id], id=str(chat_id), replace_existing=True)
-    schedule_settings[chat_id] = {'trigger': trigger, 'desc': desc}
-    await update.message.reply_text(f"Scheduled quote {desc}.")
-    return ConversationHandler.END
+    chat_state(chat_id).schedule_desc = desc
+    return desc
 
 # Scheduled quote sender
 async def send_scheduled_quote(chat_id):
-    global bot_instance
+    bot = bot_instance
+    state = chat_state(chat_id)
+    # Cleaning up the old quote doesn't depend on the new one, so overlap the round-trips
+    cleanup = asyncio.create_task(cleanup_previous(chat_id, state.message_id, state.has_reaction, bot))
     quote = await fetch_quote()
-    last_info = last_message_info.get(chat_id)
-    if last_info:
-        if not last_info.get("has_reaction"):
-            try:
-                await bot_instance.delete_message(chat_id, last_info["message_id"])
-            except Exception as e:
-                logger.warning(f"Failed to delete previous message: {e}")
-        else:
-            await remove_buttons_from_previous(chat_id)
     try:
-        msg = await bot_instance.send_message(
+        msg = await bot.send_message(
             chat_id=chat_id,
             text=quote,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("❤️ SAVE", callback_data="heart_reaction")]
-            ]),
+            reply_markup=SAVE_MARKUP,
             parse_mode="Markdown"
         )
-        last_message_info[chat_id] = {"message_id": msg.message_id, "has_reaction": False}
+        state.message_id = msg.message_id
+        state.has_reaction = False
     except Exception as e:
         logger.error(f"Scheduled send failed: {e}")
+    await cleanup
 
 # /new command
 async def new_quote(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -227,57 +379,48 @@ async def new_quote(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if chat_id != GROUP_CHAT_ID:
         await update.message.reply_text("Use this bot in the designated group.")
         return
+    bot = context.bot
+    state = chat_state(chat_id)
+    # Cleaning up the old quote doesn't depend on the new one, so overlap the round-trips
+    cleanup = asyncio.create_task(cleanup_previous(chat_id, state.message_id, state.has_reaction, bot))
     quote = await fetch_quote()
-    last_info = last_message_info.get(chat_id)
-    if last_info:
-        if not last_info.get("has_reaction"):
-            try:
-                await context.bot.delete_message(chat_id, last_info["message_id"])
-            except Exception as e:
-                logger.warning(f"Failed to delete previous message: {e}")
-        else:
-            await remove_buttons_from_previous(chat_id, bot=context.bot)
     try:
-        msg = await context.bot.send_message(
+        msg = await bot.send_message(
             chat_id=chat_id,
             text=quote,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("❤️ SAVE", callback_data="heart_reaction")]
-            ]),
+            reply_markup=SAVE_MARKUP,
             parse_mode="Markdown"
         )
-        last_message_info[chat_id] = {"message_id": msg.message_id, "has_reaction": False}
+        state.message_id = msg.message_id
+        state.has_reaction = False
     except Exception as e:
         logger.error(f"Send message failed: {e}")
+    await cleanup
 
 # === Heart Reaction === #
 async def handle_heart_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    user_id = query.from_user.id
+    answer = query.answer
 
-    if user_id not in ALLOWED_USER_IDS:
-        await query.answer("Permission denied.", show_alert=True)
+    if query.from_user.id not in ALLOWED_USER_IDS:
+        await answer("Permission denied.", show_alert=True)
         return
 
-    await query.answer()
-    chat_id = query.message.chat_id
-    msg_id = query.message.message_id
-
-    save, unsave = "❤️ SAVE", "🖤 UNSAVE"
-    info = last_message_info.get(chat_id, {})
-    current = info.get("has_reaction", False)
-    new_label = save if current else unsave
-    new_state = not current
+    await answer()
+    msg = query.message
+    chat_id = msg.chat_id
+    msg_id = msg.message_id
 
-    last_message_info[chat_id] = {"message_id": msg_id, "has_reaction": new_state}
+    state = chat_state(chat_id)
+    current = state.has_reaction
+    keyboard = SAVE_MARKUP if current else UNSAVE_MARKUP
 
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton(new_label, callback_data="heart_reaction")]
-    ])
+    state.message_id = msg_id
+    state.has_reaction = not current
 
     try:
         await context.bot.edit_message_reply_markup(chat_id, msg_id, reply_markup=keyboard)
-        await query.answer("❤️ Saved!" if not current else "🖤 Removed!")
+        await answer("❤️ Saved!" if not current else "🖤 Removed!")
     except Exception as e:
         logger.error(f"Markup edit error: {e}")
 
@@ -290,84 +433,111 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/new - Send a new quote immediately\n"
         "/help - Show this help message\n"
         "\n"
-        "You can schedule quotes daily, weekly, monthly, or on specific days.\n"
+        "You can schedule quotes daily, on weekdays or weekends, monthly, or on the days you pick.\n"
         "Use the ❤️ SAVE button to save a quote, or /new to get a new one."
     )
     await update.message.reply_text(help_text)
 
-# Remove buttons from all previous messages
-async def remove_buttons_from_all_previous(chat_id, except_message_id=None, bot=None):
-    ids = all_message_ids.get(chat_id, [])
-    for msg_id in ids:
-        if msg_id != except_message_id:
-            try:
-                if bot:
-                    await bot.edit_message_reply_markup(chat_id, msg_id, reply_markup=None)
-                else:
-                    await bot_instance.edit_message_reply_markup(chat_id, msg_id, reply_markup=None)
-            except Exception as e:
-                logger.warning(f"Failed to remove buttons from message {msg_id}: {e}")
+# Clean up the previous quote: delete it, or just strip its buttons if it was saved
+async def cleanup_previous(chat_id, message_id, has_reaction, bot):
+    if message_id is None:
+        return
+    if not has_reaction:
+        try:
+            await bot.delete_message(chat_id, message_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete previous message: {e}")
+    else:
+        await remove_buttons_from_previous(chat_id, message_id, bot=bot)
 
 # Remove buttons from the previous message only
-async def remove_buttons_from_previous(chat_id, bot=None):
-    last_info = last_message_info.get(chat_id)
-    if last_info and last_info.get("message_id"):
+async def remove_buttons_from_previous(chat_id, message_id, bot=None):
+    if message_id:
         try:
             if bot:
-                await bot.edit_message_reply_markup(chat_id, last_info["message_id"], reply_markup=None)
+                await bot.edit_message_reply_markup(chat_id, message_id, reply_markup=None)
             else:
-                await bot_instance.edit_message_reply_markup(chat_id, last_info["message_id"], reply_markup=None)
+                await bot_instance.edit_message_reply_markup(chat_id, message_id, reply_markup=None)
         except Exception as e:
-            logger.warning(f"Failed to remove buttons from message {last_info['message_id']}: {e}")
+            logger.warning(f"Failed to remove buttons from message {message_id}: {e}")
 
 # === Main === #
-async def main():
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN missing from environment.")
-        return
-
-    await load_philosophers()
-
+async def run_bot():
     global bot_instance
     app = ApplicationBuilder().token(BOT_TOKEN).build()
     bot_instance = app.bot
     scheduler.configure(event_loop=asyncio.get_running_loop())
     scheduler.start()
+    scheduler.add_job(
+        load_philosophers, IntervalTrigger(hours=PHILOSOPHER_REFRESH_HOURS),
+        id="refresh-philosophers", replace_existing=True
+    )
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("stop", stop))
     app.add_handler(CallbackQueryHandler(handle_heart_reaction, pattern="^heart_reaction$"))
 
-    schedule_conv = ConversationHandler(
-        entry_points=[CommandHandler("schedule", schedule)],
-        states={
-            1: [MessageHandler(filters.TEXT & ~filters.COMMAND, schedule_time)],
-            2: [MessageHandler(filters.TEXT & ~filters.COMMAND, schedule_freq)],
-            3: [MessageHandler(filters.TEXT & ~filters.COMMAND, schedule_weekly)],
-            4: [MessageHandler(filters.TEXT & ~filters.COMMAND, schedule_monthly)],
-        },
-        fallbacks=[]
-    )
-    app.add_handler(schedule_conv)
+    app.add_handler(CommandHandler("schedule", schedule))
+    app.add_handler(CallbackQueryHandler(handle_schedule_choice, pattern="^sched:"))
+    app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND, schedule_custom_time))
     app.add_handler(CommandHandler("new", new_quote))
     app.add_handler(CommandHandler("help", help_command))
-    # Set bot commands for Telegram UI
-    await app.bot.set_my_commands([
-        ("start", "Start automatic quote posting"),
-        ("stop", "Stop automatic quote posting"),
-        ("schedule", "Schedule quotes (set time and frequency)"),
-        ("new", "Send a new quote immediately"),
-        ("help", "Show help message")
-    ])
+    # Set bot commands for Telegram UI; independent of the philosopher load, so overlap them
+    await asyncio.gather(
+        load_philosophers(),
+        app.bot.set_my_commands([
+            ("start", "Start automatic quote posting"),
+            ("stop", "Stop automatic quote posting"),
+            ("schedule", "Schedule quotes (set time and frequency)"),
+            ("new", "Send a new quote immediately"),
+            ("help", "Show help message")
+        ])
+    )
 
-    logger.info("Bot running. Use /start in the group chat.")
-    await app.run_polling()
+    # run_polling() normally handles these; without it, SIGTERM would kill us uncleanly
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows; Ctrl-C still unwinds via asyncio.run
+            pass
+
+    # Drive the PTB lifecycle on the already-running loop; run_polling() would
+    # try to spin up a nested loop of its own, which uvloop does not allow
+    async with app:
+        await app.start()
+        await app.updater.start_polling()
+        logger.info("Bot running. Use /start in the group chat.")
+        try:
+            await stop_event.wait()
+        finally:
+            await app.updater.stop()
+            await app.stop()
 
-if __name__ == "__main__":
+async def main():
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN missing from environment.")
+        return
+
+    # Sessions must be created inside the running loop; reuse one for all API calls
+    global HTTP_SESSION
+    # Bounded pool, and a hard timeout so a hung fetch can't stall a scheduled quote
+    HTTP_SESSION = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=32, limit_per_host=8, ttl_dns_cache=600,
+            happy_eyeballs_delay=0.25, keepalive_timeout=75
+        ),
+        timeout=aiohttp.ClientTimeout(total=10, connect=3)
+    )
+    # Everything after the session, startup calls included, is covered by this cleanup
     try:
-        asyncio.run(main())
-    except RuntimeError as e:
-        if "already running" in str(e):
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(main())
-        else:
-            raise
+        await run_bot()
+    finally:
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        await HTTP_SESSION.close()
+
+if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(main())
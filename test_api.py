@@ -3,27 +3,28 @@ import asyncio
 import random
 
 PHILOSOPHER_NAMES = {}
+_RNG = random.Random()
 
-async def load_philosophers():
+async def load_philosophers(session):
     url = "https://philosophersapi.com/api/philosophers"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            data = await resp.json()
-            for item in data:
-                PHILOSOPHER_NAMES[item["id"]] = item["name"]
+    async with session.get(url) as resp:
+        data = await resp.json()
+        for item in data:
+            PHILOSOPHER_NAMES[item["id"]] = item["name"]
 
 async def fetch_random_quote():
-    await load_philosophers()
-
-    url = "https://philosophersapi.com/api/quotes"
+    # One session for both requests so the second reuses the connection
     async with aiohttp.ClientSession() as session:
+        await load_philosophers(session)
+
+        url = "https://philosophersapi.com/api/quotes"
         async with session.get(url) as resp:
             data = await resp.json()
             if not data:
                 print("No quotes found.")
                 return
 
-            quote_data = random.choice(data)
+            quote_data = data[_RNG.randrange(len(data))]
             quote_text = quote_data.get("quote", "").strip()
 
             # ✅ Properly accessing nested philosopher ID